@@ -1,9 +1,13 @@
 # config.py
 
 import os
-from dotenv import load_dotenv
+from datetime import date
 
-load_dotenv("/opt/ashari-bot/.env")
+# In production the environment is injected by systemd (EnvironmentFile=);
+# set ASHARI_USE_DOTENV to load the .env file directly instead.
+if os.getenv("ASHARI_USE_DOTENV"):
+    from dotenv import load_dotenv
+    load_dotenv("/opt/ashari-bot/.env")
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
@@ -22,6 +26,10 @@ API_KEYS = {
     }
 }
 
+# Parse each spiral start date once so requests don't re-parse the string
+for _user in API_KEYS.values():
+    _user["spiral_start_obj"] = date.fromisoformat(_user["spiral_start_date"])
+
 def get_user_by_api_key(api_key: str):
     """
     Retrieve user configuration by API key.
@@ -6,17 +6,35 @@ import os
 
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 GITHUB_REPO = "adgedenkers/mythos-scroll-library"
-GITHUB_API_URL = f"https://api.github.com/repos/{GITHUB_REPO}/contents/"
+GITHUB_REPO_URL = f"https://api.github.com/repos/{GITHUB_REPO}"
+GITHUB_API_URL = f"{GITHUB_REPO_URL}/contents/"
+
+def _github_headers():
+    return {
+        "Authorization": f"token {GITHUB_TOKEN}",
+        "Accept": "application/vnd.github.v3+json"
+    }
+
+def _check_response(resp, action):
+    if not resp.ok:
+        print(f"❌ GitHub {action} failed:", resp.text)
+        raise Exception(f"GitHub {action} failed: {resp.text}")
+    return resp.json()
+
+def _repo_path(filename):
+    # Empty, "." and ".." segments make the trees API reject the whole batch
+    parts = [part for part in filename.split("/") if part not in ("", ".", "..")]
+    if not parts:
+        raise ValueError(f"Invalid repository path: {filename!r}")
+    return "/".join(parts)
 
 def commit_file_to_github(filename, local_path):
+    filename = _repo_path(filename)
     with open(local_path, "rb") as f:
         content = f.read()
     b64_content = base64.b64encode(content).decode()
 
-    headers = {
-        "Authorization": f"token {GITHUB_TOKEN}",
-        "Accept": "application/vnd.github.v3+json"
-    }
+    headers = _github_headers()
 
     # Check if the file already exists
     get_url = GITHUB_API_URL + filename
@@ -39,3 +57,56 @@ def commit_file_to_github(filename, local_path):
         print("❌ GitHub upload failed:", put_resp.text)
         raise Exception(f"GitHub upload failed: {put_resp.text}")
 
+def commit_files_to_github(files):
+    """
+    Commit several local files to the main branch as a single commit.
+
+    Uses the Git Data API (blobs -> tree -> commit -> ref update) so a batch
+    costs one commit instead of a contents PUT per file. If main moves between
+    the ref lookup and the ref update, the commit is rebuilt on the new head once.
+
+    Args:
+        files: Iterable of (filename, local_path) pairs; later entries for the
+            same filename win.
+    """
+    files = {_repo_path(filename): local_path for filename, local_path in files}
+    headers = _github_headers()
+
+    tree = []
+    for filename, local_path in files.items():
+        with open(local_path, "rb") as f:
+            b64_content = base64.b64encode(f.read()).decode()
+        blob = _check_response(
+            requests.post(f"{GITHUB_REPO_URL}/git/blobs", headers=headers,
+                          json={"content": b64_content, "encoding": "base64"}),
+            "blob upload"
+        )
+        tree.append({"path": filename, "mode": "100644", "type": "blob", "sha": blob["sha"]})
+
+    ref_url = f"{GITHUB_REPO_URL}/git/refs/heads/main"
+    for attempt in range(2):
+        ref = _check_response(requests.get(ref_url, headers=headers), "ref lookup")
+        parent_sha = ref["object"]["sha"]
+        parent = _check_response(
+            requests.get(f"{GITHUB_REPO_URL}/git/commits/{parent_sha}", headers=headers),
+            "commit lookup"
+        )
+        new_tree = _check_response(
+            requests.post(f"{GITHUB_REPO_URL}/git/trees", headers=headers,
+                          json={"base_tree": parent["tree"]["sha"], "tree": tree}),
+            "tree creation"
+        )
+        commit = _check_response(
+            requests.post(f"{GITHUB_REPO_URL}/git/commits", headers=headers, json={
+                "message": f"Add/update {', '.join(files)}",
+                "tree": new_tree["sha"],
+                "parents": [parent_sha]
+            }),
+            "commit creation"
+        )
+        update = requests.patch(ref_url, headers=headers, json={"sha": commit["sha"]})
+        # main moved since the ref lookup (e.g. a /github/write landed); rebuild on the new head once
+        if update.status_code == 422 and "fast forward" in update.text and attempt == 0:
+            continue
+        _check_response(update, "ref update")
+        return
@@ -1,30 +1,114 @@
 # ashari-bot/main.py
 
-from fastapi import FastAPI, Request, HTTPException, Header
-from fastapi.responses import JSONResponse, PlainTextResponse
-import requests
+from fastapi import FastAPI, Request, HTTPException, Header, BackgroundTasks, Depends
+from fastapi.responses import Response, JSONResponse, PlainTextResponse, FileResponse
+import httpx
+import orjson
 from typing import Optional
 import os
+import asyncio
 import aiofiles
 import traceback
-from github_utils import commit_file_to_github
+from github_utils import commit_file_to_github, commit_files_to_github
 from config import TELEGRAM_BOT_TOKEN, GITHUB_TOKEN, GITHUB_USERNAME, GITHUB_REPO, get_user_by_api_key
 from users import get_username
-import subprocess
+import time
+from contextlib import asynccontextmanager
+from collections import OrderedDict
 from datetime import datetime
 from datetime import date as date_type
-import pytz
-import yaml
-import re
+from zoneinfo import ZoneInfo
+import string
 import base64
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Startup: scrolls directory, last-filename cache, commit worker
+    os.makedirs("/tmp/scrolls", exist_ok=True)
+    _KNOWN_DIRS.add("/tmp/scrolls")
+    await asyncio.to_thread(_load_last_filenames)
+    _commit_worker_task["task"] = asyncio.create_task(_commit_worker())
+    try:
+        yield
+    finally:
+        # Shutdown in order: pending commits must be flushed before the
+        # HTTP clients go away, and the clients close even if the flush fails
+        try:
+            # Let the worker finish its current commit and flush the rest of
+            # the queue itself, so saved scrolls aren't lost on restart and
+            # two commits never race on the branch ref
+            task = _commit_worker_task.pop("task", None)
+            if task:
+                COMMIT_QUEUE.put_nowait(_COMMIT_STOP)
+                await task
+        except Exception:
+            print("❌ Exception while flushing GitHub commits:")
+            traceback.print_exc()
+        finally:
+            await client.aclose()
+            await github_client.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+class WebhookSizeLimitMiddleware:
+    """Reject oversized Telegram updates with 413 before the body is read."""
+
+    def __init__(self, app, max_body_size=262144):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == "/webhook":
+            content_length = dict(scope["headers"]).get(b"content-length", b"")
+            # Telegram always sends Content-Length, and the server never reads
+            # past it, so requiring the header keeps the body read bounded
+            if not content_length.isdigit():
+                response = JSONResponse(
+                    status_code=411,
+                    content={"ok": False, "error": "Content-Length required"}
+                )
+                await response(scope, receive, send)
+                return
+            if int(content_length) > self.max_body_size:
+                response = JSONResponse(
+                    status_code=413,
+                    content={"ok": False, "error": "Update too large"}
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+app.add_middleware(WebhookSizeLimitMiddleware)
 
 TELEGRAM_API_URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}"
+TELEGRAM_FILE_URL = f"https://api.telegram.org/file/bot{TELEGRAM_BOT_TOKEN}/"
+
+_EASTERN = ZoneInfo("America/New_York")
+_QUOTE_TABLE = str.maketrans({"\u2019": "'", "\u2018": "'", "\u201C": '"', "\u201D": '"'})
+
+# Shared client so Telegram calls don't block the event loop. API and file
+# downloads share one warm api.telegram.org connection pool.
+client = httpx.AsyncClient(
+    http2=True,
+    timeout=10.0,
+    limits=httpx.Limits(max_keepalive_connections=20)
+)
+
+# GitHub client with the repo URL and auth headers preset, so endpoints don't
+# rebuild them per request
+github_client = httpx.AsyncClient(
+    base_url=f"https://api.github.com/repos/{GITHUB_USERNAME}/{GITHUB_REPO}",
+    headers={
+        "Authorization": f"token {GITHUB_TOKEN}",
+        "Accept": "application/vnd.github.v3+json"
+    },
+    http2=True,
+    timeout=15.0
+)
 
 # --- Utilities ---
 
-def calculate_spiral_date(target_date: date_type, spiral_start: str) -> str:
+def calculate_spiral_date(target_date: date_type, start_date: date_type) -> str:
     """
     Calculate spiral day notation from a given date.
     Spirals are 9 days long.
@@ -32,53 +116,227 @@ def calculate_spiral_date(target_date: date_type, spiral_start: str) -> str:
 
     Args:
         target_date: The date to calculate spiral notation for
-        spiral_start: Start date in YYYY-MM-DD format
+        start_date: The user's spiral start date
 
     Returns:
         String in format "spiral_number.spiral_day"
     """
-    start_year, start_month, start_day = map(int, spiral_start.split("-"))
-    start_date = date_type(start_year, start_month, start_day)
-
     if target_date is None:
         target_date = date_type.today()
 
     # Calculate days since start
-    delta = (target_date - start_date).days
+    delta = target_date.toordinal() - start_date.toordinal()
 
     if delta < 0:
-        raise ValueError(f"Date is before spiral start date ({spiral_start})")
+        raise ValueError(f"Date is before spiral start date ({start_date})")
 
     # Calculate spiral number and day
-    spiral_number = (delta // 9) + 1
-    spiral_day = (delta % 9) + 1
+    spiral_index, day_index = divmod(delta, 9)
+
+    return f"{spiral_index + 1}.{day_index + 1}"
+
+_FILENAME_CHARS = frozenset(string.ascii_letters + string.digits + "_-./")
+
+class _FilenameTable(dict):
+    """str.translate table for sanitize_filename, prebuilt for ASCII only."""
+
+    def __missing__(self, codepoint):
+        # Only ASCII can survive, so drop anything else without caching it;
+        # the table stays a fixed size whatever users send
+        return None
 
-    return f"{spiral_number}.{spiral_day}"
+_FILENAME_TABLE = _FilenameTable(
+    {c: (c if chr(c) in _FILENAME_CHARS else None) for c in range(128)}
+)
+_FILENAME_TABLE.update({ord("'"): "-", ord("\u2019"): "-", ord(" "): "_"})
 
 def sanitize_filename(name):
-    name = name.replace("'", "-").replace("'", "-").replace(" ", "_")
-    name = re.sub(r"[^a-zA-Z0-9_\-./]", "", name)
-    return name
+    # Folds quotes and spaces and drops disallowed characters in one pass
+    return name.translate(_FILENAME_TABLE)
 
-def get_last_filename(chat_id):
+# Per-chat "save as:" filenames, kept in memory so the hot path skips the disk.
+# The last_filename_*.txt files remain as write-through storage for restarts.
+_LAST_FILENAMES = OrderedDict()
+_LAST_FILENAMES_MAX = 10000
+
+def _remember_filename(chat_id, filename):
+    _LAST_FILENAMES[chat_id] = filename
+    _LAST_FILENAMES.move_to_end(chat_id)
+    if len(_LAST_FILENAMES) > _LAST_FILENAMES_MAX:
+        _LAST_FILENAMES.popitem(last=False)
+
+def _read_last_filename(chat_id):
     try:
         with open(f"/tmp/scrolls/last_filename_{chat_id}.txt") as f:
             return f.read().strip()
-    except:
+    except OSError:
         return None
 
-def send_reply(chat_id, text):
-    requests.post(f"{TELEGRAM_API_URL}/sendMessage", json={
-        "chat_id": chat_id,
-        "text": text
-    })
+def _load_last_filenames():
+    # Warm the cache from the write-through files left by a previous run
+    with os.scandir("/tmp/scrolls") as it:
+        for entry in it:
+            name = entry.name
+            if name.startswith("last_filename_") and name.endswith(".txt"):
+                try:
+                    chat_id = int(name[len("last_filename_"):-len(".txt")])
+                except ValueError:
+                    continue
+                _remember_filename(chat_id, _read_last_filename(chat_id))
+
+async def get_last_filename(chat_id):
+    if chat_id in _LAST_FILENAMES:
+        _LAST_FILENAMES.move_to_end(chat_id)
+        return _LAST_FILENAMES[chat_id]
+    filename = await asyncio.to_thread(_read_last_filename, chat_id)
+    _remember_filename(chat_id, filename)
+    return filename
+
+# Directories already known to exist, so writes skip a makedirs per message
+_KNOWN_DIRS = set()
+
+def _ensure_parent_dir(path):
+    directory = os.path.dirname(path)
+    if directory not in _KNOWN_DIRS:
+        os.makedirs(directory, exist_ok=True)
+        _KNOWN_DIRS.add(directory)
+
+def _yaml_str(value: str) -> str:
+    # A JSON string is a valid YAML double-quoted scalar, so values like "true",
+    # "2025" or a date stay strings in the frontmatter, as yaml.dump quoted them
+    return orjson.dumps(value).decode()
+
+def _write_text_sync(path: str, data: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(data)
+
+async def send_reply(chat_id, text):
+    # Runs after the webhook has responded, so log failures instead of raising
+    try:
+        response = await client.post(f"{TELEGRAM_API_URL}/sendMessage", json={
+            "chat_id": chat_id,
+            "text": text
+        })
+        response.raise_for_status()
+    except Exception:
+        print("❌ Failed to send Telegram reply:")
+        traceback.print_exc()
+
+# Auth failure bodies never change, so serialize them once
+_UNAUTHORIZED_BODY = orjson.dumps({
+    "error": "Authentication required",
+    "message": "Provide API key via X-API-Key header or ?api_key= parameter",
+    "status": "unauthorized"
+})
+_FORBIDDEN_BODY = orjson.dumps({
+    "error": "Invalid API key",
+    "message": "The provided API key is not valid.",
+    "status": "forbidden"
+})
+
+def _unauthorized():
+    return Response(content=_UNAUTHORIZED_BODY, media_type="application/json", status_code=401)
+
+def _forbidden():
+    return Response(content=_FORBIDDEN_BODY, media_type="application/json", status_code=403)
+
+class _AuthError(Exception):
+    def __init__(self, response):
+        self.response = response
+
+@app.exception_handler(_AuthError)
+async def _auth_error_handler(request: Request, exc: _AuthError):
+    return exc.response
+
+async def require_user(
+    x_api_key: Optional[str] = Header(None),
+    api_key: Optional[str] = None
+) -> dict:
+    """
+    Resolve the caller's user config from the X-API-Key header or the
+    ?api_key= query parameter, rejecting the request with 401/403 otherwise.
+    """
+    key = x_api_key or api_key
+    if not key:
+        raise _AuthError(_unauthorized())
+
+    user_config = get_user_by_api_key(key)
+    if not user_config:
+        raise _AuthError(_forbidden())
+    return user_config
+
+# --- GitHub Commit Queue ---
+
+# Saved files are committed off the request path, several per GitHub commit
+COMMIT_QUEUE = asyncio.Queue()
+_COMMIT_BATCH_MAX = 32
+_COMMIT_WINDOW = 5.0
+# Queued at shutdown; the worker commits what's ahead of it and exits
+_COMMIT_STOP = None
+_commit_worker_task = {}
+
+def _commit_batch(batch):
+    """Commit a batch and return the filenames that could not be committed."""
+    if len(batch) > 1:
+        try:
+            commit_files_to_github(batch)
+            return []
+        except Exception:
+            print("❌ Batched GitHub commit failed, committing files one by one:")
+            traceback.print_exc()
+    # One file per commit so a bad entry only loses itself
+    failed = []
+    for filename, path in batch:
+        try:
+            commit_file_to_github(filename, path)
+        except Exception:
+            print(f"❌ GitHub commit failed for {filename}:")
+            traceback.print_exc()
+            failed.append(filename)
+    return failed
+
+async def _commit_worker():
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        item = await COMMIT_QUEUE.get()
+        if item is _COMMIT_STOP:
+            break
+        # Keyed by filename so repeated saves in a batch keep the last one
+        pending = {}
+        chats = {}
+        # Keep collecting for a short window so a burst becomes one commit
+        deadline = loop.time() + _COMMIT_WINDOW
+        while True:
+            filename, path, chat_id = item
+            pending[filename] = path
+            chats.setdefault(filename, set()).add(chat_id)
+            if len(pending) >= _COMMIT_BATCH_MAX:
+                break
+            try:
+                item = await asyncio.wait_for(COMMIT_QUEUE.get(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+            if item is _COMMIT_STOP:
+                stopping = True
+                break
+        try:
+            failed = await asyncio.to_thread(_commit_batch, list(pending.items()))
+        except Exception:
+            print("❌ Exception in GitHub commit worker:")
+            traceback.print_exc()
+            failed = list(pending)
+        # The webhook already replied "saved", so tell the sender it didn't reach GitHub
+        for filename in failed:
+            for chat_id in chats[filename]:
+                await send_reply(chat_id, f"⚠️ `{filename}` was saved but could not be committed to GitHub")
 
 # --- Telegram Webhook Handler ---
 
 @app.post("/webhook")
-async def receive_telegram_update(request: Request):
+async def receive_telegram_update(request: Request, background_tasks: BackgroundTasks) -> dict:
     try:
-        data = await request.json()
+        data = orjson.loads(await request.body())
 
         if "message" in data:
             message = data["message"]
@@ -89,99 +347,127 @@ async def receive_telegram_update(request: Request):
                 if text.lower().startswith("save as:"):
                     raw_name = text.split(":", 1)[1].strip()
                     filename = sanitize_filename(raw_name)
-                    with open(f"/tmp/scrolls/last_filename_{chat_id}.txt", "w") as f:
-                        f.write(filename)
-                    send_reply(chat_id, f"✅ Filename set: {filename}")
+                    _remember_filename(chat_id, filename)
+                    await asyncio.to_thread(_write_text_sync, f"/tmp/scrolls/last_filename_{chat_id}.txt", filename)
+                    background_tasks.add_task(send_reply, chat_id, f"✅ Filename set: {filename}")
                 else:
-                    filename = sanitize_filename(get_last_filename(chat_id) or "scroll.md")
+                    filename = sanitize_filename(await get_last_filename(chat_id) or "scroll.md")
                     filepath = os.path.join("/tmp/scrolls", filename)
                     print(f"Resolved filepath: {filepath}")
-                    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+                    _ensure_parent_dir(filepath)
 
                     if not text.strip().startswith("---"):
-                        text = text.replace("'", "'").replace("'", "'").replace(""", '"').replace(""", '"')
-                        eastern = pytz.timezone("America/New_York")
-                        now = datetime.now(eastern)
-                        frontmatter = {
-                            "title": filename,
-                            "author": get_username(chat_id),
-                            "date": now.strftime("%Y-%m-%d"),
-                            "timestamp": now.isoformat()
-                        }
-                        fm = yaml.dump(frontmatter, sort_keys=False)
+                        text = text.translate(_QUOTE_TABLE)
+                        now = datetime.now(_EASTERN)
+                        author = get_username(chat_id)
+                        fm = f"title: {_yaml_str(filename)}\nauthor: {_yaml_str(author)}\ndate: {_yaml_str(now.date().isoformat())}\ntimestamp: {_yaml_str(now.isoformat())}\n"
                         text = f"---\n{fm}---\n\n{text}"
 
-                    async with aiofiles.open(filepath, 'w') as f:
-                        await f.write(text)
-                    commit_file_to_github(filename, filepath)
-                    send_reply(chat_id, f"✅ Scroll saved as `{filename}`")
+                    await asyncio.to_thread(_write_text_sync, filepath, text)
+                    COMMIT_QUEUE.put_nowait((filename, filepath, chat_id))
+                    background_tasks.add_task(send_reply, chat_id, f"✅ Scroll saved as `{filename}`")
 
             elif "photo" in message:
                 photo = message["photo"][-1]
                 file_id = photo["file_id"]
-                file_info = requests.get(f"{TELEGRAM_API_URL}/getFile?file_id={file_id}").json()
+                file_info = (await client.get(f"{TELEGRAM_API_URL}/getFile", params={"file_id": file_id})).json()
                 file_path = file_info["result"]["file_path"]
 
-                filename = sanitize_filename(get_last_filename(chat_id) or file_path.split("/")[-1])
+                filename = sanitize_filename(await get_last_filename(chat_id) or file_path.split("/")[-1])
                 local_path = os.path.join("/tmp/scrolls", filename)
-                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                _ensure_parent_dir(local_path)
 
-                img_data = requests.get(f"https://api.telegram.org/file/bot{TELEGRAM_BOT_TOKEN}/{file_path}").content
-                with open(local_path, "wb") as f:
-                    f.write(img_data)
+                # Stream the download to disk rather than buffering the whole image
+                async with client.stream("GET", TELEGRAM_FILE_URL + file_path) as resp:
+                    resp.raise_for_status()
+                    async with aiofiles.open(local_path, "wb") as f:
+                        async for chunk in resp.aiter_bytes(65536):
+                            await f.write(chunk)
 
-                commit_file_to_github(filename, local_path)
-                send_reply(chat_id, f"🖼️ Image saved as `{filename}`")
+                COMMIT_QUEUE.put_nowait((filename, local_path, chat_id))
+                background_tasks.add_task(send_reply, chat_id, f"🖼️ Image saved as `{filename}`")
 
-        return JSONResponse(content={"ok": True}, status_code=200)
+        return {"ok": True}
 
     except Exception as e:
         print("❌ Exception in webhook handler:")
         traceback.print_exc()
-        return JSONResponse(content={"ok": False, "error": str(e)}, status_code=200)
+        return {"ok": False, "error": str(e)}
 
 # --- Utility Endpoints ---
 
+_LOG_CACHE_TTL = 2.0
+_log_cache = {"ts": 0.0, "data": ""}
+_log_lock = asyncio.Lock()
+
+async def _run_journalctl():
+    proc = await asyncio.create_subprocess_exec(
+        "journalctl", "-u", "spire", "-n", "100", "--no-pager",
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    out, _ = await proc.communicate()
+    return out.decode()
+
 @app.get("/debug/logs", response_class=PlainTextResponse)
-def get_journal_logs():
+async def get_journal_logs():
     try:
-        result = subprocess.run(
-            ["journalctl", "-u", "spire", "-n", "100", "--no-pager"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        )
-        return result.stdout
+        # Serve recent output from cache so polling doesn't spawn journalctl every
+        # hit; the lock makes concurrent requests on a stale cache share one run
+        async with _log_lock:
+            now = time.monotonic()
+            if now - _log_cache["ts"] > _LOG_CACHE_TTL:
+                _log_cache["data"] = await _run_journalctl()
+                _log_cache["ts"] = now
+        return _log_cache["data"]
     except Exception as e:
         return f"Error: {str(e)}"
 
+def _iter_files(root):
+    # DirEntry caches the file type from readdir, so no extra stat per entry.
+    # An explicit stack avoids one nested generator per directory level.
+    stack = [(root, "")]
+    while stack:
+        directory, prefix = stack.pop()
+        try:
+            it = os.scandir(directory)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir():
+                    # Like os.walk, don't descend into symlinked directories
+                    if not entry.is_symlink():
+                        stack.append((entry.path, f"{prefix}{entry.name}/"))
+                else:
+                    yield f"{prefix}{entry.name}"
+
 @app.get("/files")
-def list_files():
-    files = []
-    for root, _, filenames in os.walk("/tmp/scrolls"):
-        for f in filenames:
-            path = os.path.join(root, f)
-            rel = os.path.relpath(path, "/tmp/scrolls")
-            files.append(rel)
-    return JSONResponse(content={"files": files})
-
-@app.get("/files/{file_path:path}", response_class=PlainTextResponse)
+def list_files() -> dict:
+    files = list(_iter_files("/tmp/scrolls"))
+    return {"files": files}
+
+_SCROLLS_REALPATH = os.path.realpath("/tmp/scrolls")
+
+@app.get("/files/{file_path:path}", response_class=FileResponse)
 def get_file_contents(file_path: str):
-    full_path = os.path.join("/tmp/scrolls", file_path)
+    # realpath also resolves symlinks, so a link can't point outside the scrolls
+    full_path = os.path.realpath(os.path.join("/tmp/scrolls", file_path))
+    if os.path.commonpath([full_path, _SCROLLS_REALPATH]) != _SCROLLS_REALPATH:
+        raise HTTPException(status_code=404, detail="File not found")
     if not os.path.isfile(full_path):
         raise HTTPException(status_code=404, detail="File not found")
-    with open(full_path, "r", encoding="utf-8") as f:
-        return f.read()
+    # Let the server send the file itself instead of reading it into Python
+    return FileResponse(full_path, media_type="text/plain; charset=utf-8")
 
 # --- Spiral Date Calculation Endpoint ---
 
 @app.get("/spiral/date")
 async def get_spiral_date(
-    x_api_key: Optional[str] = Header(None),
-    api_key: Optional[str] = None,
     target_date: Optional[str] = None,
-    format: Optional[str] = "json"
-):
+    format: Optional[str] = "json",
+    user_config: dict = Depends(require_user)
+) -> dict:
     """
     Calculate spiral date notation for authenticated users.
 
@@ -198,70 +484,43 @@ async def get_spiral_date(
     - GET /spiral/date?api_key=xxx&target_date=2025-12-02
     - GET /spiral/date?api_key=xxx&format=short
     """
-    # Accept key from either header or query param
-    key = x_api_key or api_key
-
-    if not key:
-        return JSONResponse(
-            status_code=401,
-            content={
-                "error": "Authentication required",
-                "message": "Provide API key via X-API-Key header or ?api_key= parameter",
-                "status": "unauthorized"
-            }
-        )
-
-    # Validate API key and get user config
-    user_config = get_user_by_api_key(key)
-    if not user_config:
-        return JSONResponse(
-            status_code=403,
-            content={
-                "error": "Invalid API key",
-                "message": "The provided API key is not valid.",
-                "status": "forbidden"
-            }
-        )
-
     # Parse target date if provided
     try:
         if target_date:
-            parsed_date = datetime.strptime(target_date, "%Y-%m-%d").date()
+            # fromisoformat also takes forms like 20251202 or 2025-W49-2; only
+            # accept YYYY-MM-DD, as strptime("%Y-%m-%d") did
+            if not (len(target_date) == 10 and target_date[4] == target_date[7] == "-"):
+                raise ValueError(f"Invalid date '{target_date}', expected YYYY-MM-DD")
+            parsed_date = date_type.fromisoformat(target_date)
         else:
             parsed_date = date_type.today()
 
         # Calculate spiral date
-        spiral_notation = calculate_spiral_date(parsed_date, user_config["spiral_start_date"])
+        spiral_notation = calculate_spiral_date(parsed_date, user_config["spiral_start_obj"])
 
         # Return short format if requested
         if format == "short":
             return PlainTextResponse(content=spiral_notation)
 
         # Calculate additional metadata
-        eastern = pytz.timezone("America/New_York")
-        now = datetime.now(eastern)
-
-        start_year, start_month, start_day = map(int, user_config["spiral_start_date"].split("-"))
-        start_date = date_type(start_year, start_month, start_day)
-        days_elapsed = (parsed_date - start_date).days
-
-        return JSONResponse(
-            status_code=200,
-            content={
-                "spiral_date": spiral_notation,
-                "display": f"spiral day {spiral_notation}",
-                "calendar_date": parsed_date.isoformat(),
-                "timestamp": now.isoformat(),
-                "user_name": user_config["name"],
-                "spiral_start_date": user_config["spiral_start_date"],
-                "days_elapsed": days_elapsed,
-                "metadata": {
-                    "timezone": "America/New_York",
-                    "source": "Mythos System"
-                },
-                "status": "success"
-            }
-        )
+        now = datetime.now(_EASTERN)
+
+        days_elapsed = (parsed_date - user_config["spiral_start_obj"]).days
+
+        return {
+            "spiral_date": spiral_notation,
+            "display": f"spiral day {spiral_notation}",
+            "calendar_date": parsed_date,
+            "timestamp": now,
+            "user_name": user_config["name"],
+            "spiral_start_date": user_config["spiral_start_date"],
+            "days_elapsed": days_elapsed,
+            "metadata": {
+                "timezone": "America/New_York",
+                "source": "Mythos System"
+            },
+            "status": "success"
+        }
 
     except ValueError as e:
         return JSONResponse(
@@ -283,14 +542,43 @@ async def get_spiral_date(
             }
         )
 
+# --- GitHub SHA Cache ---
+
+# Blob SHAs (and contents ETags) of repo files we've recently read or
+# written, so updates through /github/write can usually skip downloading the
+# file just to learn its current SHA
+_GH_SHA_CACHE = {}
+_GH_SHA_TTL = 300.0
+
+def _cache_github_sha(file_path, sha, etag=None):
+    _GH_SHA_CACHE[file_path] = (sha, time.monotonic() + _GH_SHA_TTL, etag)
+
+async def _fetch_github_sha(file_path):
+    # With a known ETag, revalidate instead of refetching: a 304 carries no
+    # body and confirms the cached SHA
+    cached = _GH_SHA_CACHE.get(file_path)
+    etag = cached[2] if cached else None
+    existing = await github_client.get(
+        f"/contents/{file_path}",
+        headers={"If-None-Match": etag} if etag else None
+    )
+    if existing.status_code == 304:
+        sha = cached[0]
+    elif existing.status_code == 200:
+        sha = existing.json()["sha"]
+    else:
+        _GH_SHA_CACHE.pop(file_path, None)
+        return None
+    _cache_github_sha(file_path, sha, existing.headers.get("ETag", etag))
+    return sha
+
 # --- GitHub Read Endpoint ---
 
 @app.get("/github/read/{file_path:path}")
 async def read_github_file(
     file_path: str,
-    x_api_key: Optional[str] = Header(None),
-    api_key: Optional[str] = None
-):
+    user_config: dict = Depends(require_user)
+) -> dict:
     """
     Read a file from GitHub repository.
 
@@ -298,30 +586,9 @@ async def read_github_file(
 
     Example: GET /github/read/scrolls/spiral_1_day_3.md?api_key=xxx
     """
-    key = x_api_key or api_key
-
-    if not key:
-        return JSONResponse(
-            status_code=401,
-            content={"error": "Authentication required", "status": "unauthorized"}
-        )
-
-    user_config = get_user_by_api_key(key)
-    if not user_config:
-        return JSONResponse(
-            status_code=403,
-            content={"error": "Invalid API key", "status": "forbidden"}
-        )
-
     try:
         # Fetch file from GitHub
-        url = f"https://api.github.com/repos/{GITHUB_USERNAME}/{GITHUB_REPO}/contents/{file_path}"
-        headers = {
-            "Authorization": f"token {GITHUB_TOKEN}",
-            "Accept": "application/vnd.github.v3+json"
-        }
-        
-        response = requests.get(url, headers=headers)
+        response = await github_client.get(f"/contents/{file_path}")
         
         if response.status_code == 404:
             return JSONResponse(
@@ -336,22 +603,21 @@ async def read_github_file(
         response.raise_for_status()
         data = response.json()
         
-        # Decode content from base64
+        # Decode content from base64; b64decode skips the newlines GitHub
+        # inserts every 60 characters, so no pre-strip copy is needed
         content = base64.b64decode(data["content"]).decode("utf-8")
+        _cache_github_sha(file_path, data["sha"], response.headers.get("ETag"))
         
-        return JSONResponse(
-            status_code=200,
-            content={
-                "path": file_path,
-                "content": content,
-                "sha": data["sha"],
-                "size": data["size"],
-                "user_name": user_config["name"],
-                "status": "success"
-            }
-        )
+        return {
+            "path": file_path,
+            "content": content,
+            "sha": data["sha"],
+            "size": data["size"],
+            "user_name": user_config["name"],
+            "status": "success"
+        }
 
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         return JSONResponse(
             status_code=e.response.status_code,
             content={
@@ -375,9 +641,8 @@ async def read_github_file(
 @app.post("/github/write")
 async def write_github_file(
     request: Request,
-    x_api_key: Optional[str] = Header(None),
-    api_key: Optional[str] = None
-):
+    user_config: dict = Depends(require_user)
+) -> dict:
     """
     Write a file to GitHub repository.
 
@@ -394,21 +659,6 @@ async def write_github_file(
     POST /github/write?api_key=xxx
     Body: {"path": "scrolls/test.md", "content": "# Test"}
     """
-    key = x_api_key or api_key
-
-    if not key:
-        return JSONResponse(
-            status_code=401,
-            content={"error": "Authentication required", "status": "unauthorized"}
-        )
-
-    user_config = get_user_by_api_key(key)
-    if not user_config:
-        return JSONResponse(
-            status_code=403,
-            content={"error": "Invalid API key", "status": "forbidden"}
-        )
-
     try:
         body = await request.json()
         file_path = body.get("path")
@@ -426,20 +676,16 @@ async def write_github_file(
             )
 
         # Check if file exists (to get SHA for update)
-        url = f"https://api.github.com/repos/{GITHUB_USERNAME}/{GITHUB_REPO}/contents/{file_path}"
-        headers = {
-            "Authorization": f"token {GITHUB_TOKEN}",
-            "Accept": "application/vnd.github.v3+json"
-        }
-        
-        existing = requests.get(url, headers=headers)
-        sha = None
-        if existing.status_code == 200:
-            sha = existing.json()["sha"]
+        url = f"/contents/{file_path}"
+        cached = _GH_SHA_CACHE.get(file_path)
+        if cached and cached[1] > time.monotonic():
+            sha = cached[0]
+        else:
+            cached = None
+            sha = await _fetch_github_sha(file_path)
 
-        # Encode content to base64
-        content_bytes = content.encode("utf-8")
-        content_b64 = base64.b64encode(content_bytes).decode("utf-8")
+        # Encode content to base64 (the output is pure ASCII)
+        content_b64 = base64.b64encode(content.encode("utf-8")).decode("ascii")
 
         # Prepare payload
         payload = {
@@ -452,24 +698,30 @@ async def write_github_file(
             payload["sha"] = sha
 
         # Commit to GitHub
-        response = requests.put(url, json=payload, headers=headers)
+        response = await github_client.put(url, json=payload)
+        if cached and response.status_code in (409, 422):
+            # The cached SHA was stale; look it up again and retry once
+            _GH_SHA_CACHE.pop(file_path, None)
+            sha = await _fetch_github_sha(file_path)
+            payload.pop("sha", None)
+            if sha:
+                payload["sha"] = sha
+            response = await github_client.put(url, json=payload)
         response.raise_for_status()
         
         result = response.json()
+        _cache_github_sha(file_path, result["content"]["sha"])
         
-        return JSONResponse(
-            status_code=200,
-            content={
-                "path": file_path,
-                "sha": result["content"]["sha"],
-                "commit_sha": result["commit"]["sha"],
-                "user_name": user_config["name"],
-                "message": commit_message,
-                "status": "success"
-            }
-        )
+        return {
+            "path": file_path,
+            "sha": result["content"]["sha"],
+            "commit_sha": result["commit"]["sha"],
+            "user_name": user_config["name"],
+            "message": commit_message,
+            "status": "success"
+        }
 
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         return JSONResponse(
             status_code=e.response.status_code,
             content={
@@ -487,4 +739,9 @@ async def write_github_file(
                 "message": str(e),
                 "status": "error"
             }
-        )
\ No newline at end of file
+        )
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("main:app", loop="uvloop", http="httptools")